@@ -30,6 +30,8 @@ def main():
                        help="Minimum object coverage to keep annotation")
     parser.add_argument("--resize-output", type=int, nargs=2, 
                        help="Resize output tiles to this size (width height)")
+    parser.add_argument("--num-workers", type=int, 
+                       help="Number of worker processes used for tiling")
     parser.add_argument("--validate", action="store_true", 
                        help="Validate output after processing")
     
@@ -51,6 +53,8 @@ def main():
         config.tiling.min_object_coverage = args.min_coverage
     if args.resize_output:
         config.tiling.resize_output = tuple(args.resize_output)
+    if args.num_workers is not None:
+        config.processing.num_workers = args.num_workers
     
     print("Dataset Tiling Application")
     print("=" * 40)
@@ -61,6 +65,7 @@ def main():
     print(f"Min coverage: {config.tiling.min_object_coverage}")
     if config.tiling.resize_output:
         print(f"Resize output: {config.tiling.resize_output}")
+    print(f"Workers: {config.processing.num_workers}")
     print("=" * 40)
     
     # Validate input
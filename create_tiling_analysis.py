@@ -35,6 +35,9 @@ def create_tiling_analysis(dataset_path: str, output_dir: str, target_image: str
     # Create category lookup
     categories = {cat.id: cat.name for cat in dataset.categories}
     
+    # Annotations grouped by image (built once and cached on the dataset)
+    anns_by_image = dataset.annotations_by_image()
+    
     # Initialize visualizer
     visualizer = BoundingBoxVisualizer()
     
@@ -72,8 +75,7 @@ def create_tiling_analysis(dataset_path: str, output_dir: str, target_image: str
             print(f"  Image size: {image.size}")
             
             # Get annotations for this image
-            image_annotations = [ann for ann in dataset.annotations 
-                               if ann.image_id == image_info.id]
+            image_annotations = anns_by_image.get(image_info.id, [])
             print(f"  Annotations: {len(image_annotations)}")
             
             # Create tiling overview
@@ -5,12 +5,15 @@ Debug script to verify tile-annotation mapping
 
 import sys
 import os
-from PIL import Image, ImageDraw, ImageFont
+import numpy as np
+from pathlib import Path
+from PIL import Image, ImageDraw
 
 # Add the src directory to the path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
 
 from src.models.coco import CocoDataset
+from src.utils.visualization import FONT_REGULAR, load_font
 
 
 def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, target_image: str):
@@ -31,23 +34,27 @@ def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, targ
     
     # Load original image
     orig_path = f'{original_dataset_path}/train/{target_image}'
-    orig_img = Image.open(orig_path)
+    with Image.open(orig_path) as image:
+        orig_img = image.convert('RGB')
     
     print(f"✅ Original image loaded: {orig_img.size}")
     
     # Get original annotations
-    orig_annotations = [ann for ann in original.annotations if ann.image_id == orig_img_info.id]
+    orig_annotations = original.annotations_by_image().get(orig_img_info.id, [])
     print(f"📋 Original annotations: {len(orig_annotations)}")
     
     # Find corresponding tiles
-    base_name = target_image.replace('.jpg', '')
-    tile_images = [img for img in tiled.images if base_name in img.file_name]
+    base_name = Path(target_image).stem
+    tile_images = [img for img in tiled.images if img.file_name.rpartition('_tile_')[0] == base_name]
     print(f"🧩 Found {len(tile_images)} tiles")
     
     # Create output directory
     debug_dir = "./debug_tile_mapping"
     os.makedirs(debug_dir, exist_ok=True)
     
+    # Load the label font once for all debug images
+    font = load_font(FONT_REGULAR, 16)
+    
     # Check specific problematic tiles
     problem_tiles = [
         '112_jpg.rf.7ad9edc92c4e2368a5710d1e7c8a6ab9_tile_2048_1536.jpg',
@@ -64,8 +71,7 @@ def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, targ
             continue
         
         # Parse offset from filename
-        parts = tile_filename.split('_tile_')
-        offset_str = parts[1].replace('.jpg', '')
+        offset_str = tile_filename.rpartition('_tile_')[2].replace('.jpg', '')
         tile_x, tile_y = map(int, offset_str.split('_'))
         
         print(f"📍 Tile offset: ({tile_x}, {tile_y})")
@@ -76,14 +82,15 @@ def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, targ
             print(f"❌ Tile file not found: {tile_path}")
             continue
         
-        actual_tile = Image.open(tile_path)
+        with Image.open(tile_path) as image:
+            actual_tile = image.convert('RGB')
         print(f"🖼️  Tile size: {actual_tile.size}")
         
         # Extract expected region from original
         expected_tile = orig_img.crop((tile_x, tile_y, tile_x + 512, tile_y + 512))
         
         # Get tile annotations from dataset
-        tile_annotations = [ann for ann in tiled.annotations if ann.image_id == tile_info.id]
+        tile_annotations = tiled.annotations_by_image().get(tile_info.id, [])
         print(f"🏷️  Tile annotations: {len(tile_annotations)}")
         
         # Create debug visualization
@@ -93,30 +100,25 @@ def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, targ
         debug_img = Image.new('RGB', (debug_width, debug_height), 'white')
         draw = ImageDraw.Draw(debug_img)
         
-        # Try to load font
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-        except:
-            font = ImageFont.load_default()
-        
         # Paste images
         debug_img.paste(expected_tile, (10, 80))
         debug_img.paste(actual_tile, (532, 80))
         
-        # Create difference image
-        diff_img = Image.new('RGB', (512, 512), 'black')
-        diff_pixels = []
-        
-        for y in range(512):
-            for x in range(512):
-                expected_px = expected_tile.getpixel((x, y))
-                actual_px = actual_tile.getpixel((x, y))
-                
-                if expected_px == actual_px:
-                    diff_img.putpixel((x, y), (0, 128, 0))  # Green for match
-                else:
-                    diff_img.putpixel((x, y), (255, 0, 0))  # Red for mismatch
-                    diff_pixels.append((x, y, expected_px, actual_px))
+        # Create difference image (green = match, red = mismatch)
+        expected_px = np.asarray(expected_tile)
+        actual_px = np.asarray(actual_tile)
+        if np.array_equal(expected_px, actual_px):
+            # Identical tiles need no per-pixel mask
+            diff_img = Image.new('RGB', expected_tile.size, (0, 128, 0))
+            diff_count = 0
+        else:
+            mismatch = np.any(expected_px != actual_px, axis=-1)
+            diff = np.empty_like(expected_px)
+            diff[...] = (0, 128, 0)
+            diff[mismatch] = (255, 0, 0)
+            diff_img = Image.fromarray(diff)
+            ys, xs = np.nonzero(mismatch)
+            diff_count = len(xs)
         
         debug_img.paste(diff_img, (1054, 80))
         
@@ -127,7 +129,7 @@ def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, targ
         
         draw.text((10, 30), f"Offset: ({tile_x}, {tile_y})", fill='blue', font=font)
         draw.text((532, 30), f"Annotations: {len(tile_annotations)}", fill='blue', font=font)
-        draw.text((1054, 30), f"Mismatches: {len(diff_pixels)}", fill='red' if diff_pixels else 'green', font=font)
+        draw.text((1054, 30), f"Mismatches: {diff_count}", fill='red' if diff_count else 'green', font=font)
         
         # Draw annotations on expected and actual
         for ann in tile_annotations:
@@ -148,11 +150,11 @@ def debug_tile_mapping(original_dataset_path: str, tiled_dataset_path: str, targ
         print(f"💾 Debug image saved: {debug_path}")
         
         # Print pixel difference summary
-        if diff_pixels:
-            print(f"⚠️  Found {len(diff_pixels)} pixel differences")
-            if len(diff_pixels) <= 10:
-                for x, y, exp, act in diff_pixels[:5]:
-                    print(f"   ({x},{y}): expected {exp} vs actual {act}")
+        if diff_count:
+            print(f"⚠️  Found {diff_count} pixel differences")
+            if diff_count <= 10:
+                for x, y in zip(xs[:5], ys[:5]):
+                    print(f"   ({x},{y}): expected {tuple(expected_px[y, x].tolist())} vs actual {tuple(actual_px[y, x].tolist())}")
         else:
             print("✅ Images match perfectly")
     
@@ -17,23 +17,57 @@ import sys
 import os
 import shutil
 import json
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any, Set
+from typing import List, Dict, Any, Set, Tuple
 from datetime import datetime
 
 # Add src to Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from src.config.settings import ProcessingConfig, env_num_workers
 from src.models.coco import CocoDataset, CocoImage, CocoAnnotation, CocoCategory, CocoInfo, CocoLicense
 
 
+def _fast_copy(source_path: str, dest_path: str) -> None:
+    """Copy file contents (no metadata), letting the kernel move the data.
+    
+    On Linux os.copy_file_range copies inside the kernel and can reflink on
+    copy-on-write filesystems; elsewhere shutil.copyfile uses its own fast paths.
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(source_path, 'rb') as src, open(dest_path, 'wb') as dst:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            if remaining == 0:
+                return
+            # Stopped short (the source changed size, or the filesystem reports 0
+            # bytes copied); redo the whole copy with shutil rather than keep a truncated file
+        except OSError:
+            pass  # e.g. unsupported by the filesystem; fall back to shutil
+    
+    shutil.copyfile(source_path, dest_path)
+
+
 class DatasetMerger:
     """Merges multiple COCO datasets into a single unified dataset."""
     
-    def __init__(self):
+    def __init__(self, link_images: bool = False, num_workers: int = ProcessingConfig.num_workers,
+                 verbose: bool = False):
+        self.link_images = link_images  # hard-link source images instead of copying
+        self.verbose = verbose  # print per-category and per-annotation details
+        self.num_workers = max(1, num_workers)  # threads used to copy/link image files
+        self.placements: Dict[str, Future] = {}  # dest path -> copy/link job writing it
         self.merged_images = []
         self.merged_annotations = []
         self.merged_categories = []
+        self.category_by_name: Dict[str, CocoCategory] = {}  # name -> merged category
         self.category_id_mapping = {}  # old_id -> new_id
         self.next_image_id = 1
         self.next_annotation_id = 1
@@ -63,10 +97,20 @@ class DatasetMerger:
         print("🔄 Processing datasets...")
         print("-" * 60)
         
-        for i, (dataset_path, dataset_name) in enumerate(validated_datasets, 1):
-            print(f"📁 [{i}/{len(validated_datasets)}] Processing: {dataset_name}")
-            self._process_dataset(dataset_path, dataset_name, train_output_dir)
-            print()
+        # Image copies run in the background while the next datasets are loaded
+        # and remapped; IDs are still assigned in dataset order
+        with ThreadPoolExecutor(max_workers=self.num_workers) as copy_executor:
+            pending_copies = []
+            for i, (dataset_path, dataset_name) in enumerate(validated_datasets, 1):
+                print(f"📁 [{i}/{len(validated_datasets)}] Processing: {dataset_name}")
+                pending_copies.extend(
+                    self._process_dataset(dataset_path, dataset_name, train_output_dir, copy_executor)
+                )
+                print()
+            
+            # Surface any copy errors before writing the merged annotations
+            for future in pending_copies:
+                future.result()
         
         # Create merged dataset
         print("📦 Creating unified dataset...")
@@ -111,8 +155,12 @@ class DatasetMerger:
             
         return validated_datasets
     
-    def _process_dataset(self, dataset_path: str, dataset_name: str, output_dir: str) -> None:
-        """Process a single dataset and add to merged collections."""
+    def _process_dataset(self, dataset_path: str, dataset_name: str, output_dir: str,
+                         copy_executor: ThreadPoolExecutor) -> List[Future]:
+        """Process a single dataset and add to merged collections.
+        
+        Returns the futures of the image copies submitted to copy_executor.
+        """
         
         # Load dataset
         annotations_path = os.path.join(dataset_path, "train", "_annotations.coco.json")
@@ -124,8 +172,8 @@ class DatasetMerger:
         category_mapping = self._process_categories(dataset.categories, dataset_name)
         
         # Process images
-        image_id_mapping = self._process_images(
-            dataset.images, dataset_path, dataset_name, output_dir
+        image_id_mapping, copies = self._process_images(
+            dataset.images, dataset_path, dataset_name, output_dir, copy_executor
         )
         
         # Process annotations
@@ -134,23 +182,24 @@ class DatasetMerger:
         )
         
         print(f"   ✅ Processed: {len(image_id_mapping)} images, {len(dataset.annotations)} annotations")
+        return copies
     
     def _process_categories(self, categories: List[CocoCategory], dataset_name: str) -> Dict[int, int]:
         """Process categories and return old_id -> new_id mapping."""
         category_mapping = {}
+        reused = 0
+        created = 0
         
         for category in categories:
             # Check if this category already exists (by name)
-            existing_category = None
-            for merged_cat in self.merged_categories:
-                if merged_cat.name == category.name:
-                    existing_category = merged_cat
-                    break
+            existing_category = self.category_by_name.get(category.name)
             
             if existing_category:
                 # Use existing category ID
                 category_mapping[category.id] = existing_category.id
-                print(f"   🔗 Category '{category.name}': reused ID {existing_category.id}")
+                reused += 1
+                if self.verbose:
+                    print(f"   🔗 Category '{category.name}': reused ID {existing_category.id}")
             else:
                 # Create new category with new ID
                 new_category = CocoCategory(
@@ -159,29 +208,54 @@ class DatasetMerger:
                     supercategory=category.supercategory
                 )
                 self.merged_categories.append(new_category)
+                self.category_by_name[new_category.name] = new_category
                 category_mapping[category.id] = self.next_category_id
-                print(f"   ➕ Category '{category.name}': new ID {self.next_category_id}")
+                created += 1
+                if self.verbose:
+                    print(f"   ➕ Category '{category.name}': new ID {self.next_category_id}")
                 self.next_category_id += 1
         
+        print(f"   🏪 Categories: {reused} reused, {created} new")
         return category_mapping
     
     def _process_images(self, images: List[CocoImage], dataset_path: str, 
-                       dataset_name: str, output_dir: str) -> Dict[int, int]:
-        """Process images and return old_id -> new_id mapping."""
+                       dataset_name: str, output_dir: str,
+                       copy_executor: ThreadPoolExecutor) -> Tuple[Dict[int, int], List[Future]]:
+        """Process images and return old_id -> new_id mapping and pending copies."""
         image_id_mapping = {}
+        new_images = []
+        copies = []
+        
+        # List the source directory once instead of stat-ing every image
+        train_dir = os.path.join(dataset_path, "train")
+        with os.scandir(train_dir) as entries:
+            available_files = {entry.name for entry in entries}
+        
+        # Prefix file names with the dataset name to avoid conflicts
+        prefix = f"{dataset_name}_"
         
         for image in images:
-            # Create new filename with dataset prefix
             original_filename = image.file_name
-            name_parts = os.path.splitext(original_filename)
-            new_filename = f"{dataset_name}_{name_parts[0]}{name_parts[1]}"
+            new_filename = prefix + original_filename
             
             # Copy image file
-            source_path = os.path.join(dataset_path, "train", original_filename)
+            source_path = os.path.join(train_dir, original_filename)
             dest_path = os.path.join(output_dir, new_filename)
             
-            if os.path.exists(source_path):
-                shutil.copy2(source_path, dest_path)
+            # File names with subdirectories are not in the listing; stat those
+            if original_filename in available_files or os.path.exists(source_path):
+                # Two images can map to one destination (datasets sharing a name, or a
+                # repeated file_name); wait for the earlier placement so the later image
+                # deterministically replaces it instead of racing with it
+                previous = self.placements.get(dest_path)
+                if previous is not None:
+                    print(f"   ⚠️  Warning: {new_filename} is used more than once; the later image replaces it")
+                    previous.result()
+                
+                # File copies are I/O bound, so they run on the copy thread pool
+                placement = copy_executor.submit(self._place_image, source_path, dest_path)
+                self.placements[dest_path] = placement
+                copies.append(placement)
             else:
                 print(f"   ⚠️  Warning: Image file not found: {source_path}")
             
@@ -193,17 +267,46 @@ class DatasetMerger:
                 file_name=new_filename
             )
             
-            self.merged_images.append(new_image)
+            new_images.append(new_image)
             image_id_mapping[image.id] = self.next_image_id
             self.next_image_id += 1
         
-        return image_id_mapping
+        self.merged_images.extend(new_images)
+        return image_id_mapping, copies
+    
+    def _place_image(self, source_path: str, dest_path: str) -> None:
+        """Copy an image into the merged dataset, or hard-link it when enabled.
+        
+        The file is staged under a unique temporary name and moved onto
+        ``dest_path`` with os.replace, so an existing destination (possibly a
+        hard link to a source image) is never opened for writing.
+        """
+        tmp_path = f"{dest_path}.{uuid.uuid4().hex}.tmp"
+        try:
+            linked = False
+            if self.link_images:
+                try:
+                    os.link(source_path, tmp_path)
+                    linked = True
+                except OSError:
+                    pass  # e.g. different filesystems; fall back to copying
+            
+            if not linked:
+                _fast_copy(source_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            raise
     
     def _process_annotations(self, annotations: List[CocoAnnotation], 
                            image_id_mapping: Dict[int, int],
                            category_mapping: Dict[int, int],
                            dataset_name: str) -> None:
         """Process annotations with ID remapping."""
+        new_annotations = []
+        missing_images = 0
+        missing_categories = 0
         
         for annotation in annotations:
             # Remap IDs
@@ -211,26 +314,32 @@ class DatasetMerger:
             new_category_id = category_mapping.get(annotation.category_id)
             
             if new_image_id is None:
-                print(f"   ⚠️  Warning: Image ID {annotation.image_id} not found in mapping")
+                missing_images += 1
+                if self.verbose:
+                    print(f"   ⚠️  Warning: Image ID {annotation.image_id} not found in mapping")
                 continue
                 
             if new_category_id is None:
-                print(f"   ⚠️  Warning: Category ID {annotation.category_id} not found in mapping")
+                missing_categories += 1
+                if self.verbose:
+                    print(f"   ⚠️  Warning: Category ID {annotation.category_id} not found in mapping")
                 continue
             
-            # Create new annotation
-            new_annotation = CocoAnnotation(
-                id=self.next_annotation_id,
-                image_id=new_image_id,
-                category_id=new_category_id,
-                segmentation=annotation.segmentation,
-                area=annotation.area,
-                bbox=annotation.bbox,
-                iscrowd=annotation.iscrowd
-            )
+            # Remap the loaded annotation in place; the source dataset is discarded
+            # after merging, so there is no need to build a copy
+            annotation.id = self.next_annotation_id
+            annotation.image_id = new_image_id
+            annotation.category_id = new_category_id
             
-            self.merged_annotations.append(new_annotation)
+            new_annotations.append(annotation)
             self.next_annotation_id += 1
+        
+        self.merged_annotations.extend(new_annotations)
+        
+        if missing_images:
+            print(f"   ⚠️  Warning: skipped {missing_images} annotations with unknown image IDs")
+        if missing_categories:
+            print(f"   ⚠️  Warning: skipped {missing_categories} annotations with unknown category IDs")
     
     def _create_merged_dataset(self, validated_datasets: List[tuple]) -> CocoDataset:
         """Create the final merged dataset object."""
@@ -296,6 +405,13 @@ def main():
                        help="Output path for merged dataset")
     parser.add_argument("--validate", action="store_true",
                        help="Validate merged dataset after creation")
+    parser.add_argument("--link-images", action="store_true",
+                       help="Hard-link images into the merged dataset instead of copying them "
+                            "(falls back to copying when linking is not possible)")
+    parser.add_argument("--verbose", action="store_true",
+                       help="Print per-category and per-annotation merge details")
+    parser.add_argument("--num-workers", type=int, default=env_num_workers(),
+                       help="Number of threads used to copy images (default: NUM_WORKERS, currently %(default)s)")
     
     args = parser.parse_args()
     
@@ -304,7 +420,8 @@ def main():
         sys.exit(1)
     
     try:
-        merger = DatasetMerger()
+        merger = DatasetMerger(link_images=args.link_images, num_workers=args.num_workers,
+                               verbose=args.verbose)
         merger.merge_datasets(args.datasets, args.output)
         
         if args.validate:
@@ -29,6 +29,11 @@ class ProcessingConfig:
     generate_tiles_only: bool = False
 
 
+def env_num_workers() -> int:
+    """Worker count from the NUM_WORKERS environment variable."""
+    return int(os.getenv("NUM_WORKERS", ProcessingConfig.num_workers))
+
+
 @dataclass
 class AppConfig:
     tiling: TilingConfig
@@ -61,7 +66,7 @@ class AppConfig:
             ),
             processing=ProcessingConfig(
                 batch_size=int(os.getenv("BATCH_SIZE", 32)),
-                num_workers=int(os.getenv("NUM_WORKERS", 4)),
+                num_workers=env_num_workers(),
                 save_original_annotations=bool(os.getenv("SAVE_ORIGINAL", True)),
                 generate_tiles_only=bool(os.getenv("TILES_ONLY", False))
             )
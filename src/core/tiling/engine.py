@@ -1,4 +1,5 @@
-from typing import List, Tuple, Generator
+from functools import lru_cache
+from typing import List, Tuple, Generator, Optional
 import numpy as np
 from PIL import Image
 
@@ -6,96 +7,148 @@ from src.config.settings import TilingConfig
 from src.models.coco import CocoAnnotation
 
 
+@lru_cache(maxsize=128)
+def _tile_offsets(img_width: int, img_height: int, tile_width: int, tile_height: int,
+                  overlap: int) -> np.ndarray:
+    """Compute the (N, 2) array of (x, y) tile offsets.
+    
+    Memoized because datasets usually contain many images of the same size.
+    The returned array is shared between calls and is therefore read-only.
+    """
+    step_x = tile_width - overlap
+    step_y = tile_height - overlap
+    
+    # Regular grid positions plus one tile flush with the right/bottom edge.
+    # np.unique drops the edge position when the grid already ends there;
+    # images smaller than a tile get a single (padded) tile at 0.
+    edge_x = max(img_width - tile_width, 0)
+    edge_y = max(img_height - tile_height, 0)
+    xs = np.unique(np.append(np.arange(0, edge_x + 1, step_x), edge_x))
+    ys = np.unique(np.append(np.arange(0, edge_y + 1, step_y), edge_y))
+    
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    offsets = np.stack([grid_x.ravel(), grid_y.ravel()], axis=1)
+    offsets.setflags(write=False)
+    return offsets
+
+
 class TilingEngine:
     def __init__(self, config: TilingConfig):
         self.config = config
     
-    def generate_tiles(self, image: Image.Image) -> Generator[Tuple[Image.Image, Tuple[int, int], float], None, None]:
-        """Generate tiles from an image with optional overlap and resizing."""
-        img_width, img_height = image.size
+    def tile_offsets(self, image_size: Tuple[int, int]) -> np.ndarray:
+        """Return the (N, 2) array of (x, y) tile offsets for an image size."""
+        img_width, img_height = image_size
         tile_width, tile_height = self.config.tile_size
-        overlap = self.config.overlap
-        
-        step_x = tile_width - overlap
-        step_y = tile_height - overlap
-        
-        # Calculate scaling factor if resize is enabled
-        scale_factor = 1.0
-        if self.config.resize_output:
-            resize_width, resize_height = self.config.resize_output
-            scale_factor = min(resize_width / tile_width, resize_height / tile_height)
-        
-        for y in range(0, img_height - tile_height + 1, step_y):
-            for x in range(0, img_width - tile_width + 1, step_x):
-                tile = image.crop((x, y, x + tile_width, y + tile_height))
-                
-                # Resize tile if requested
-                if self.config.resize_output:
-                    tile = tile.resize(self.config.resize_output, Image.LANCZOS)
-                
-                yield tile, (x, y), scale_factor
+        return _tile_offsets(img_width, img_height, tile_width, tile_height, self.config.overlap)
+    
+    def scale_factor(self) -> float:
+        """Scale applied to tile coordinates when resize_output is enabled."""
+        if not self.config.resize_output:
+            return 1.0
+        tile_width, tile_height = self.config.tile_size
+        resize_width, resize_height = self.config.resize_output
+        return min(resize_width / tile_width, resize_height / tile_height)
+    
+    def generate_tiles_from_array(self, pixels: np.ndarray) -> Generator[Tuple[np.ndarray, Tuple[int, int], float], None, None]:
+        """Generate tiles from an already decoded (H, W[, C]) pixel array.
         
-        # Handle edge cases - tiles that don't fit perfectly
-        if img_width % step_x != 0:
-            x = img_width - tile_width
-            for y in range(0, img_height - tile_height + 1, step_y):
-                tile = image.crop((x, y, x + tile_width, y + tile_height))
-                if self.config.resize_output:
-                    tile = tile.resize(self.config.resize_output, Image.LANCZOS)
-                yield tile, (x, y), scale_factor
+        Tiles are zero-copy views into ``pixels`` and are not resized. When the
+        image is smaller than a tile, the tile is zero-padded like PIL's crop.
+        """
+        tile_width, tile_height = self.config.tile_size
+        img_height, img_width = pixels.shape[:2]
+        scale_factor = self.scale_factor()
         
-        if img_height % step_y != 0:
-            y = img_height - tile_height
-            for x in range(0, img_width - tile_width + 1, step_x):
-                tile = image.crop((x, y, x + tile_width, y + tile_height))
-                if self.config.resize_output:
-                    tile = tile.resize(self.config.resize_output, Image.LANCZOS)
-                yield tile, (x, y), scale_factor
+        for x, y in self.tile_offsets((img_width, img_height)).tolist():
+            if x + tile_width > img_width or y + tile_height > img_height:
+                # Image smaller than a tile: pad with black
+                tile = np.zeros((tile_height, tile_width) + pixels.shape[2:], dtype=pixels.dtype)
+                src_x2 = min(x + tile_width, img_width)
+                src_y2 = min(y + tile_height, img_height)
+                tile[:src_y2 - y, :src_x2 - x] = pixels[y:src_y2, x:src_x2]
+            else:
+                tile = pixels[y:y + tile_height, x:x + tile_width]
+            
+            yield tile, (x, y), scale_factor
+    
+    def generate_tiles(self, image: Image.Image) -> Generator[Tuple[Image.Image, Tuple[int, int], float], None, None]:
+        """Generate tiles from an image with optional overlap and resizing."""
+        # Decode once and cut every tile from the same pixel array
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
         
-        # Corner tile if needed
-        if img_width % step_x != 0 and img_height % step_y != 0:
-            x = img_width - tile_width
-            y = img_height - tile_height
-            tile = image.crop((x, y, x + tile_width, y + tile_height))
+        for pixels, tile_offset, scale_factor in self.generate_tiles_from_array(np.asarray(image)):
+            tile = Image.fromarray(pixels)
+            
+            # Resize tile if requested
             if self.config.resize_output:
                 tile = tile.resize(self.config.resize_output, Image.LANCZOS)
-            yield tile, (x, y), scale_factor
+            
+            yield tile, tile_offset, scale_factor
+    
+    @staticmethod
+    def bbox_array(annotations: List[CocoAnnotation]) -> np.ndarray:
+        """Stack annotation bboxes into an (N, 4) [x, y, width, height] array."""
+        return np.array([ann.bbox for ann in annotations], dtype=np.float64).reshape(-1, 4)
+    
+    def row_candidates(self, bboxes: np.ndarray, tile_y: int) -> np.ndarray:
+        """Indices of the bboxes that vertically overlap a row of tiles at tile_y.
+        
+        Uses the same vertical test as transform_annotations, so restricting a
+        tile's annotations to these candidates does not change its result.
+        """
+        tile_height = self.config.tile_size[1]
+        y = bboxes[:, 1]
+        y2 = y + bboxes[:, 3]
+        return np.flatnonzero(~((y2 < tile_y) | (y > tile_y + tile_height)))
     
     def transform_annotations(self, annotations: List[CocoAnnotation], 
                             tile_offset: Tuple[int, int], 
-                            scale_factor: float = 1.0) -> List[CocoAnnotation]:
-        """Transform annotations for a specific tile with optional scaling."""
+                            scale_factor: float = 1.0,
+                            bboxes: Optional[np.ndarray] = None) -> List[CocoAnnotation]:
+        """Transform annotations for a specific tile with optional scaling.
+        
+        ``bboxes`` may be passed in (see ``bbox_array``) so the array is built
+        once per source image rather than once per tile.
+        """
+        # Background images are common; skip the array work entirely
+        if not annotations:
+            return []
+        
         tile_x, tile_y = tile_offset
         tile_width, tile_height = self.config.tile_size
-        transformed_annotations = []
         
-        for ann in annotations:
-            bbox = ann.bbox  # [x, y, width, height]
-            x, y, width, height = bbox
-            
-            # Check if annotation intersects with tile
-            if (x + width < tile_x or x > tile_x + tile_width or
-                y + height < tile_y or y > tile_y + tile_height):
-                continue
-            
-            # Calculate intersection area for coverage check
-            inter_x1 = max(x, tile_x)
-            inter_y1 = max(y, tile_y)
-            inter_x2 = min(x + width, tile_x + tile_width)
-            inter_y2 = min(y + height, tile_y + tile_height)
-            
-            inter_area = (inter_x2 - inter_x1) * (inter_y2 - inter_y1)
-            original_area = width * height
-            
-            # Check if enough of the object is visible
-            if inter_area / original_area < self.config.min_object_coverage:
-                continue
-            
-            # Transform coordinates to tile space and apply scaling if needed
-            new_x = (x - tile_x) * scale_factor
-            new_y = (y - tile_y) * scale_factor
-            new_width = width * scale_factor
-            new_height = height * scale_factor
+        if bboxes is None:
+            bboxes = self.bbox_array(annotations)
+        
+        x, y, width, height = bboxes.T
+        x2 = x + width
+        y2 = y + height
+        
+        # Check which annotations intersect with the tile
+        intersects = ~((x2 < tile_x) | (x > tile_x + tile_width) |
+                       (y2 < tile_y) | (y > tile_y + tile_height))
+        
+        # Calculate intersection area for coverage check
+        inter_width = np.minimum(x2, tile_x + tile_width) - np.maximum(x, tile_x)
+        inter_height = np.minimum(y2, tile_y + tile_height) - np.maximum(y, tile_y)
+        original_area = width * height
+        
+        # Check if enough of the object is visible
+        with np.errstate(divide='ignore', invalid='ignore'):
+            coverage = (inter_width * inter_height) / original_area
+        keep = np.flatnonzero(intersects & (coverage >= self.config.min_object_coverage))
+        
+        # Transform coordinates to tile space and apply scaling if needed
+        new_xy = (bboxes[keep, :2] - (tile_x, tile_y)) * scale_factor
+        new_wh = bboxes[keep, 2:] * scale_factor
+        new_area = original_area[keep] * (scale_factor ** 2)  # Scale area by square of scale factor
+        
+        transformed_annotations = []
+        for i, (new_x, new_y), (new_width, new_height), area in zip(
+                keep.tolist(), new_xy.tolist(), new_wh.tolist(), new_area.tolist()):
+            ann = annotations[i]
             
             # Create new annotation with original dimensions preserved
             new_annotation = CocoAnnotation(
@@ -103,7 +156,7 @@ class TilingEngine:
                 image_id=ann.image_id,  # Will be reassigned later
                 category_id=ann.category_id,
                 segmentation=self._transform_segmentation(ann.segmentation, tile_offset, scale_factor),
-                area=original_area * (scale_factor ** 2),  # Scale area by square of scale factor
+                area=area,
                 bbox=[new_x, new_y, new_width, new_height],
                 iscrowd=ann.iscrowd
             )
@@ -115,15 +168,13 @@ class TilingEngine:
                                tile_offset: Tuple[int, int],
                                scale_factor: float = 1.0) -> List[List[float]]:
         """Transform segmentation coordinates to tile space with optional scaling."""
-        tile_x, tile_y = tile_offset
-        transformed_segmentation = []
-        
-        for segment in segmentation:
-            transformed_segment = []
-            for i in range(0, len(segment), 2):
-                x = (segment[i] - tile_x) * scale_factor
-                y = (segment[i + 1] - tile_y) * scale_factor
-                transformed_segment.extend([x, y])
-            transformed_segmentation.append(transformed_segment)
+        # RLE masks ({'counts', 'size'}) describe the full image and cannot be
+        # shifted like polygons; tile annotations keep only their bbox
+        if isinstance(segmentation, dict):
+            return []
         
-        return transformed_segmentation
\ No newline at end of file
+        offset = np.array(tile_offset, dtype=np.float64)
+        return [
+            ((np.asarray(segment, dtype=np.float64).reshape(-1, 2) - offset) * scale_factor).ravel().tolist()
+            for segment in segmentation
+        ]
@@ -1,9 +1,17 @@
 from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 import json
+import sys
+from operator import attrgetter, itemgetter
 
+from src.utils.helpers import atomic_write, load_json, orjson
 
-@dataclass
+# Record classes use __slots__ where dataclasses support it (Python 3.10+);
+# large datasets hold millions of annotations, and slots drop the per-object dict
+_RECORD_OPTIONS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**_RECORD_OPTIONS)
 class CocoImage:
     id: int
     width: int
@@ -16,14 +24,14 @@ class CocoImage:
     extra: Optional[Dict[str, Any]] = None
 
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class CocoCategory:
     id: int
     name: str
     supercategory: str
 
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class CocoAnnotation:
     id: int
     image_id: int
@@ -34,7 +42,7 @@ class CocoAnnotation:
     iscrowd: int = 0
 
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class CocoInfo:
     year: int
     version: str
@@ -44,13 +52,40 @@ class CocoInfo:
     date_created: str
 
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class CocoLicense:
     id: int
     name: str
     url: str
 
 
+# Field names per record class, computed once instead of for every parsed record
+_RECORD_FIELDS = {
+    record_type: frozenset(record_type.__dataclass_fields__)
+    for record_type in (CocoImage, CocoCategory, CocoAnnotation, CocoInfo, CocoLicense)
+}
+
+# Ordered field names and a matching attrgetter per record class, so a record
+# is read with a single C-level call when converting it to a dict
+_RECORD_GETTERS = {
+    record_type: (tuple(record_type.__dataclass_fields__), attrgetter(*record_type.__dataclass_fields__))
+    for record_type in _RECORD_FIELDS
+}
+
+# itemgetter over the field names per record class; it pulls a JSON record's
+# values in field order so the record can be built with positional arguments
+_RECORD_ITEMS = {
+    record_type: itemgetter(*record_type.__dataclass_fields__)
+    for record_type in _RECORD_FIELDS
+}
+
+
+def _record_dict(record) -> Dict[str, Any]:
+    """Return a record's fields as a dict (records may not have a __dict__)."""
+    names, getter = _RECORD_GETTERS[type(record)]
+    return dict(zip(names, getter(record)))
+
+
 @dataclass
 class CocoDataset:
     info: CocoInfo
@@ -58,37 +93,94 @@ class CocoDataset:
     images: List[CocoImage]
     annotations: List[CocoAnnotation]
     categories: List[CocoCategory]
+    _annotation_index: Optional[Dict[int, List[CocoAnnotation]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _category_names: Optional[Dict[int, str]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    
+    def annotations_by_image(self) -> Dict[int, List[CocoAnnotation]]:
+        """Annotations grouped by image ID, built in one pass on first use.
+        
+        The index is not refreshed if ``annotations`` is modified afterwards.
+        """
+        if self._annotation_index is None:
+            index = {}
+            for ann in self.annotations:
+                index.setdefault(ann.image_id, []).append(ann)
+            self._annotation_index = index
+        return self._annotation_index
+    
+    def category_names(self) -> Dict[int, str]:
+        """Category name by category ID, built on first use.
+        
+        Like annotations_by_image, the mapping is not refreshed if ``categories`` changes.
+        """
+        if self._category_names is None:
+            self._category_names = {cat.id: cat.name for cat in self.categories}
+        return self._category_names
     
     @classmethod
     def from_json(cls, json_path: str):
-        with open(json_path, 'r') as f:
-            data = json.load(f)
+        data = load_json(json_path)
         
         # Helper function to safely create dataclass instances
         def safe_create_instance(dataclass_type, data_dict):
             # Get the field names that the dataclass expects
-            field_names = {field.name for field in dataclass_type.__dataclass_fields__.values()}
+            field_names = _RECORD_FIELDS[dataclass_type]
+            if field_names.issuperset(data_dict):
+                return dataclass_type(**data_dict)
             # Filter the data to only include expected fields
-            filtered_data = {k: v for k, v in data_dict.items() if k in field_names}
+            filtered_data = {k: data_dict[k] for k in field_names.intersection(data_dict)}
             return dataclass_type(**filtered_data)
         
+        def create_instances(dataclass_type, records):
+            # The construction path is chosen once per list: records are built
+            # positionally when the first one carries every field (extra keys are
+            # ignored), and through keywords otherwise, e.g. images without the
+            # optional keys. Odd records in a positional list still fall back.
+            if not records or not _RECORD_FIELDS[dataclass_type] <= records[0].keys():
+                return [safe_create_instance(dataclass_type, record) for record in records]
+            get_fields = _RECORD_ITEMS[dataclass_type]
+            instances = []
+            for record in records:
+                try:
+                    instances.append(dataclass_type(*get_fields(record)))
+                except KeyError:
+                    instances.append(safe_create_instance(dataclass_type, record))
+            return instances
+        
         return cls(
             info=safe_create_instance(CocoInfo, data['info']) if 'info' in data and data['info'] else None,
-            licenses=[safe_create_instance(CocoLicense, license) for license in data.get('licenses', [])],
-            images=[safe_create_instance(CocoImage, img) for img in data['images']],
-            annotations=[safe_create_instance(CocoAnnotation, ann) for ann in data['annotations']],
-            categories=[safe_create_instance(CocoCategory, cat) for cat in data['categories']]
+            licenses=create_instances(CocoLicense, data.get('licenses', [])),
+            images=create_instances(CocoImage, data['images']),
+            annotations=create_instances(CocoAnnotation, data['annotations']),
+            categories=create_instances(CocoCategory, data['categories'])
         )
     
     def to_dict(self) -> Dict[str, Any]:
         return {
-            'info': self.info.__dict__ if self.info else {},
-            'licenses': [license.__dict__ for license in self.licenses],
-            'images': [img.__dict__ for img in self.images],
-            'annotations': [ann.__dict__ for ann in self.annotations],
-            'categories': [cat.__dict__ for cat in self.categories]
+            'info': _record_dict(self.info) if self.info else {},
+            'licenses': [_record_dict(license) for license in self.licenses],
+            'images': [_record_dict(img) for img in self.images],
+            'annotations': [_record_dict(ann) for ann in self.annotations],
+            'categories': [_record_dict(cat) for cat in self.categories]
         }
     
     def save_json(self, output_path: str):
-        with open(output_path, 'w') as f:
-            json.dump(self.to_dict(), f, indent=2)
\ No newline at end of file
+        if orjson is not None:
+            # orjson serializes the dataclass records natively (fields in
+            # declaration order), so no intermediate dict per record is built
+            payload = {
+                'info': self.info if self.info else {},
+                'licenses': self.licenses,
+                'images': self.images,
+                'annotations': self.annotations,
+                'categories': self.categories
+            }
+            with atomic_write(output_path, 'wb') as f:
+                f.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+        else:
+            with atomic_write(output_path) as f:
+                json.dump(self.to_dict(), f, indent=2)
\ No newline at end of file
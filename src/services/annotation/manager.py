@@ -1,3 +1,4 @@
+from dataclasses import replace
 from typing import List, Dict, Any, Tuple
 import json
 import os
@@ -26,7 +27,7 @@ class AnnotationManager:
     @staticmethod
     def get_annotations_for_image(dataset: CocoDataset, image_id: int) -> List[CocoAnnotation]:
         """Get all annotations for a specific image."""
-        return [ann for ann in dataset.annotations if ann.image_id == image_id]
+        return list(dataset.annotations_by_image().get(image_id, []))
     
     @staticmethod
     def filter_annotations_by_category(annotations: List[CocoAnnotation], 
@@ -82,39 +83,43 @@ class AnnotationManager:
         max_annotation_id = max(ann.id for ann in merged_annotations) if merged_annotations else 0
         max_category_id = max(cat.id for cat in merged_categories) if merged_categories else 0
         
+        # Category lookup by name, kept up to date as categories are added; the
+        # first category with a given name wins, as in a front-to-back search
+        category_id_by_name = {}
+        for cat in merged_categories:
+            category_id_by_name.setdefault(cat.name, cat.id)
+        
         for dataset in datasets[1:]:
             # Create ID mappings
             image_id_mapping = {}
             category_id_mapping = {}
             
-            # Merge categories
+            # Merge categories (copies are remapped so the input datasets stay untouched)
             for category in dataset.categories:
-                existing_cat = next((cat for cat in merged_categories if cat.name == category.name), None)
-                if existing_cat:
-                    category_id_mapping[category.id] = existing_cat.id
+                existing_id = category_id_by_name.get(category.name)
+                if existing_id is not None:
+                    category_id_mapping[category.id] = existing_id
                 else:
                     max_category_id += 1
-                    new_category = category
-                    new_category.id = max_category_id
-                    merged_categories.append(new_category)
+                    merged_categories.append(replace(category, id=max_category_id))
+                    category_id_by_name[category.name] = max_category_id
                     category_id_mapping[category.id] = max_category_id
             
             # Merge images
             for image in dataset.images:
                 max_image_id += 1
                 image_id_mapping[image.id] = max_image_id
-                new_image = image
-                new_image.id = max_image_id
-                merged_images.append(new_image)
+                merged_images.append(replace(image, id=max_image_id))
             
             # Merge annotations
             for annotation in dataset.annotations:
                 max_annotation_id += 1
-                new_annotation = annotation
-                new_annotation.id = max_annotation_id
-                new_annotation.image_id = image_id_mapping[annotation.image_id]
-                new_annotation.category_id = category_id_mapping[annotation.category_id]
-                merged_annotations.append(new_annotation)
+                merged_annotations.append(replace(
+                    annotation,
+                    id=max_annotation_id,
+                    image_id=image_id_mapping[annotation.image_id],
+                    category_id=category_id_mapping[annotation.category_id]
+                ))
         
         return CocoDataset(
             info=base_dataset.info,
@@ -1,8 +1,11 @@
 import os
 import shutil
 import time
+from collections import deque
+from itertools import count
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 from pathlib import Path
 from PIL import Image
 
@@ -13,6 +16,96 @@ from src.services.image.handler import ImageHandler
 from src.services.annotation.manager import AnnotationManager
 
 
+# Tile encoding/writing runs on a few threads per worker so it overlaps with
+# cropping and annotation math; the queue of pending writes is bounded.
+_WRITER_THREADS = 2
+_MAX_PENDING_WRITES = 32
+
+# Per-process state for tiling workers, set up once by _init_worker
+_worker_config: Optional[AppConfig] = None
+_worker_engine: Optional[TilingEngine] = None
+_worker_writer: Optional[ThreadPoolExecutor] = None
+
+
+def _init_worker(config: AppConfig) -> None:
+    """Build the tiling engine and tile writer once per worker process."""
+    global _worker_config, _worker_engine, _worker_writer
+    _worker_config = config
+    _worker_engine = TilingEngine(config.tiling)
+    _shutdown_writer()
+    _worker_writer = ThreadPoolExecutor(max_workers=_WRITER_THREADS)
+
+
+def _shutdown_writer() -> None:
+    """Stop this process's tile writer pool, if one was started."""
+    global _worker_writer
+    if _worker_writer is not None:
+        _worker_writer.shutdown()
+        _worker_writer = None
+
+
+def _forget_writer() -> None:
+    """Drop the writer pool inherited through fork; its threads did not survive."""
+    global _worker_writer
+    _worker_writer = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_writer)
+
+
+def _tile_image(original_image: CocoImage, image_annotations: List[CocoAnnotation]
+                ) -> Optional[Tuple[Tuple[int, int], List[Tuple[str, int, int, List[CocoAnnotation]]]]]:
+    """Tile a single source image and write its tiles to disk.
+    
+    Returns the source image size and a (file name, width, height, annotations)
+    entry per tile, or None if the image file is missing. IDs are assigned by
+    the caller so the output does not depend on worker scheduling.
+    """
+    config = _worker_config
+    image_path = os.path.join(config.dataset.input_path, "train", original_image.file_name)
+    
+    try:
+        image = Image.open(image_path)
+    except FileNotFoundError:
+        return None
+    
+    bboxes = _worker_engine.bbox_array(image_annotations)
+    stem = Path(original_image.file_name).stem
+    output_dir = os.path.join(config.dataset.output_path, "train")  # created by process_dataset
+    row_y = None
+    tiles = []
+    pending_writes = deque()
+    
+    for tile, tile_offset, scale_factor in _worker_engine.generate_tiles(image):
+        tile_filename = f"{stem}_tile_{tile_offset[0]}_{tile_offset[1]}.jpg"
+        
+        # Save tile image
+        tile_output_path = os.path.join(output_dir, tile_filename)
+        pending_writes.append(_worker_writer.submit(ImageHandler.save_jpeg, tile, tile_output_path))
+        if len(pending_writes) > _MAX_PENDING_WRITES:
+            pending_writes.popleft().result()
+        
+        # Tiles come row by row; narrow the annotations to the current row once
+        if tile_offset[1] != row_y:
+            row_y = tile_offset[1]
+            row_idx = _worker_engine.row_candidates(bboxes, row_y)
+            row_annotations = [image_annotations[i] for i in row_idx.tolist()]
+            row_bboxes = bboxes[row_idx]
+        
+        # Transform annotations for this tile
+        tile_annotations = _worker_engine.transform_annotations(
+            row_annotations, tile_offset, scale_factor, row_bboxes
+        )
+        tiles.append((tile_filename, tile.width, tile.height, tile_annotations))
+    
+    # Make sure every tile is on disk (and surface write errors) before reporting back
+    for future in pending_writes:
+        future.result()
+    
+    return image.size, tiles
+
+
 class DatasetProcessor:
     def __init__(self, config: AppConfig):
         self.config = config
@@ -48,8 +141,8 @@ class DatasetProcessor:
         print()
         
         # Initialize counters for new IDs
-        new_image_id = 1
-        new_annotation_id = 1
+        image_ids = count(1)
+        annotation_ids = count(1)
         
         # Storage for new dataset
         new_images = []
@@ -63,77 +156,79 @@ class DatasetProcessor:
         print("🚀 Starting image processing...")
         print("=" * 60)
         
-        # Process each image
-        for i, original_image in enumerate(original_dataset.images, 1):
-            # Progress indicator
-            progress_pct = (i / total_images) * 100
-            print(f"📸 [{i:4d}/{total_images}] ({progress_pct:5.1f}%) Processing: {original_image.file_name}")
-            
-            image_path = os.path.join(self.config.dataset.input_path, "train", original_image.file_name)
-            
-            if not os.path.exists(image_path):
-                print(f"   ⚠️  Warning: Image file not found: {image_path}")
-                continue
-            
-            # Load image
-            image = Image.open(image_path)
-            print(f"   📏 Image size: {image.size}")
-            
-            # Get annotations for this image
-            image_annotations = [ann for ann in original_dataset.annotations 
-                               if ann.image_id == original_image.id]
-            print(f"   🏷️  Annotations: {len(image_annotations)}")
-            
-            # Track tiles for this image
-            image_tile_count = 0
-            
-            # Generate tiles
-            for tile, tile_offset, scale_factor in self.tiling_engine.generate_tiles(image):
-                image_tile_count += 1
-                # Create new image entry
-                tile_filename = f"{Path(original_image.file_name).stem}_tile_{tile_offset[0]}_{tile_offset[1]}.jpg"
+        # Create the output directory once, before any worker writes tiles
+        os.makedirs(os.path.join(self.config.dataset.output_path, "train"), exist_ok=True)
+        
+        # Tile images in worker processes; results come back in input order so
+        # IDs are assigned exactly as in a sequential run
+        num_workers = self.config.processing.num_workers
+        images = original_dataset.images
+        annotations_by_image = original_dataset.annotations_by_image()
+        image_annotations = [annotations_by_image.get(original_image.id, []) for original_image in images]
+        
+        if num_workers > 1:
+            executor = ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker,
+                                           initargs=(self.config,))
+            results = executor.map(_tile_image, images, image_annotations)
+        else:
+            executor = None
+            _init_worker(self.config)
+            results = map(_tile_image, images, image_annotations)
+        
+        try:
+            for i, (original_image, annotations, result) in enumerate(
+                    zip(images, image_annotations, results), 1):
+                # Progress indicator: one line per image keeps stdout writes low
+                progress_pct = (i / total_images) * 100
+                progress = f"📸 [{i:4d}/{total_images}] ({progress_pct:5.1f}%) {original_image.file_name}"
                 
-                new_image = CocoImage(
-                    id=new_image_id,
-                    width=tile.width,
-                    height=tile.height,
-                    file_name=tile_filename
-                )
-                new_images.append(new_image)
+                if result is None:
+                    image_path = os.path.join(self.config.dataset.input_path, "train", original_image.file_name)
+                    print(f"{progress}\n   ⚠️  Warning: Image file not found: {image_path}")
+                    continue
                 
-                # Save tile image
-                tile_output_path = os.path.join(self.config.dataset.output_path, "train", tile_filename)
-                os.makedirs(os.path.dirname(tile_output_path), exist_ok=True)
-                tile.save(tile_output_path)
+                image_size, tiles = result
                 
-                # Transform annotations for this tile
-                tile_annotations = self.tiling_engine.transform_annotations(
-                    image_annotations, tile_offset, scale_factor
-                )
+                for tile_filename, tile_width, tile_height, tile_annotations in tiles:
+                    new_image_id = next(image_ids)
+                    
+                    # Create new image entry
+                    new_image = CocoImage(
+                        id=new_image_id,
+                        width=tile_width,
+                        height=tile_height,
+                        file_name=tile_filename
+                    )
+                    new_images.append(new_image)
+                    
+                    # Update annotation IDs and image references
+                    for ann in tile_annotations:
+                        ann.id = next(annotation_ids)
+                        ann.image_id = new_image_id
+                        new_annotations.append(ann)
+                    
+                    generated_tiles += 1
+                    processed_annotations += len(tile_annotations)
                 
-                # Update annotation IDs and image references
-                for ann in tile_annotations:
-                    ann.id = new_annotation_id
-                    ann.image_id = new_image_id
-                    new_annotations.append(ann)
-                    new_annotation_id += 1
+                # Summary for this image
+                print(f"{progress}: {image_size[0]}x{image_size[1]}, "
+                      f"{len(annotations)} annotations → {len(tiles)} tiles")
+                processed_images += 1
                 
-                generated_tiles += 1
-                processed_annotations += len(tile_annotations)
-                new_image_id += 1
-            
-            # Summary for this image
-            print(f"   ✅ Generated {image_tile_count} tiles")
-            processed_images += 1
-            
-            # Show periodic summary
-            if i % 50 == 0 or i == total_images:
-                print()
-                print(f"📈 Progress Summary (after {i} images):")
-                print(f"   🖼️  Processed images: {processed_images}")
-                print(f"   🧩 Generated tiles: {generated_tiles}")
-                print(f"   🏷️  Processed annotations: {processed_annotations}")
-                print("=" * 60)
+                # Show periodic summary
+                if i % 50 == 0 or i == total_images:
+                    print()
+                    print(f"📈 Progress Summary (after {i} images):")
+                    print(f"   🖼️  Processed images: {processed_images}")
+                    print(f"   🧩 Generated tiles: {generated_tiles}")
+                    print(f"   🏷️  Processed annotations: {processed_annotations}")
+                    print("=" * 60)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+            else:
+                # Don't keep idle writer threads around for a later fork
+                _shutdown_writer()
         
         print()
         print("💾 Saving dataset...")
@@ -185,10 +280,15 @@ class DatasetProcessor:
         try:
             dataset = CocoDataset.from_json(annotations_path)
             
-            # Check if all referenced images exist
+            # Check if all referenced images exist, listing the directory once
+            # instead of stat-ing every tile
+            train_dir = os.path.join(self.config.dataset.output_path, "train")
+            with os.scandir(train_dir) as entries:
+                existing_files = {entry.name for entry in entries}
+            
             for image in dataset.images:
-                image_path = os.path.join(self.config.dataset.output_path, "train", image.file_name)
-                if not os.path.exists(image_path):
+                image_path = os.path.join(train_dir, image.file_name)
+                if image.file_name not in existing_files and not os.path.exists(image_path):
                     print(f"Missing image file: {image_path}")
                     return False
             
@@ -3,6 +3,14 @@ from typing import Tuple, Optional
 from PIL import Image
 import numpy as np
 
+# Optional libjpeg-turbo bindings for faster JPEG encoding; PIL is used when
+# PyTurboJPEG or the native library is not available.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    _turbo_jpeg = TurboJPEG()
+except Exception:
+    _turbo_jpeg = None
+
 
 class ImageHandler:
     """Handles image loading, processing, and saving operations."""
@@ -27,6 +35,17 @@ class ImageHandler:
             print(f"Error saving image {output_path}: {e}")
             return False
     
+    @staticmethod
+    def save_jpeg(image: Image.Image, output_path: str, quality: int = 75) -> None:
+        """Encode an image as JPEG, using libjpeg-turbo directly when available."""
+        if _turbo_jpeg is not None and image.mode == "RGB":
+            data = _turbo_jpeg.encode(np.asarray(image), quality=quality,
+                                      pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+            with open(output_path, "wb") as f:
+                f.write(data)
+        else:
+            image.save(output_path, format="JPEG", quality=quality)
+    
     @staticmethod
     def get_image_dimensions(image_path: str) -> Optional[Tuple[int, int]]:
         """Get image dimensions without fully loading the image."""
@@ -52,10 +71,10 @@ class ImageHandler:
                     maintain_aspect_ratio: bool = False) -> Image.Image:
         """Resize an image to the specified size."""
         if maintain_aspect_ratio:
-            image.thumbnail(size, Image.Resampling.LANCZOS)
+            image.thumbnail(size, Image.LANCZOS)
             return image
         else:
-            return image.resize(size, Image.Resampling.LANCZOS)
+            return image.resize(size, Image.LANCZOS)
     
     @staticmethod
     def crop_image(image: Image.Image, bbox: Tuple[int, int, int, int]) -> Image.Image:
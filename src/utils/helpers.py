@@ -1,16 +1,46 @@
 import os
 import json
+import mmap
+from contextlib import contextmanager
 from typing import Any, Dict, List
 from pathlib import Path
 
+# orjson is an optional, much faster JSON parser and encoder; fall back to the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 def ensure_directory(path: str) -> None:
     """Ensure that a directory exists, create if it doesn't."""
     os.makedirs(path, exist_ok=True)
 
 
+@contextmanager
+def atomic_write(file_path: str, mode: str = 'w'):
+    """Open a temporary file next to ``file_path`` and move it into place on success."""
+    tmp_path = f"{file_path}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
 def load_json(file_path: str) -> Dict[str, Any]:
     """Load JSON data from file."""
+    if orjson is not None:
+        with open(file_path, 'rb') as f:
+            # Parse from a read-only mapping of the file rather than a bytes copy of
+            # it; empty files cannot be mapped and go through read() to report the error
+            if os.fstat(f.fileno()).st_size == 0:
+                return orjson.loads(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
     with open(file_path, 'r') as f:
         return json.load(f)
 
@@ -18,7 +48,12 @@ def load_json(file_path: str) -> Dict[str, Any]:
 def save_json(data: Dict[str, Any], file_path: str, indent: int = 2) -> None:
     """Save data to JSON file."""
     ensure_directory(os.path.dirname(file_path))
-    with open(file_path, 'w') as f:
+    # orjson only supports 2-space indentation; other indents use the stdlib
+    if orjson is not None and indent == 2:
+        with atomic_write(file_path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
+    with atomic_write(file_path) as f:
         json.dump(data, f, indent=indent)
 
 
@@ -35,11 +70,26 @@ def is_image_file(file_path: str) -> bool:
 
 def get_files_with_extension(directory: str, extension: str) -> List[str]:
     """Get all files with specified extension in directory."""
+    # Walks the tree with os.scandir, whose entries carry the file type from the
+    # directory listing, in the same top-down order as os.walk
     files = []
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            if filename.lower().endswith(extension.lower()):
-                files.append(os.path.join(root, filename))
+    extension = extension.lower()
+    stack = [directory]
+    while stack:
+        subdirs = []
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        # Like os.walk, symlinked directories are not followed
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                    elif entry.name.lower().endswith(extension):
+                        files.append(entry.path)
+        except OSError:
+            # Keep what was listed before the error instead of pruning it
+            pass
+        stack.extend(reversed(subdirs))
     return files
 
 
@@ -50,12 +100,14 @@ def generate_unique_filename(base_path: str, filename: str) -> str:
         return filename
     
     name, ext = os.path.splitext(filename)
+    # List the directory once instead of probing every candidate with a stat call
+    taken = {entry.name for entry in os.scandir(base_path)
+             if entry.name.startswith(name) and entry.name.endswith(ext)}
     counter = 1
     
     while True:
         new_filename = f"{name}_{counter}{ext}"
-        new_path = os.path.join(base_path, new_filename)
-        if not os.path.exists(new_path):
+        if new_filename not in taken:
             return new_filename
         counter += 1
 
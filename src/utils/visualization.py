@@ -1,10 +1,31 @@
 import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from operator import attrgetter
 from typing import List, Tuple, Optional
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import random
 
+from src.config.settings import TilingConfig
+from src.core.tiling.engine import TilingEngine
 from src.models.coco import CocoDataset, CocoAnnotation, CocoImage
 
+FONT_BOLD = "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf"
+FONT_REGULAR = "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf"
+
+
+@lru_cache(maxsize=64)
+def load_font(path: str, size: int):
+    """Load a TrueType font once per (path, size), falling back to arial.ttf and then PIL's default font."""
+    for font_path in (path, "arial.ttf"):
+        try:
+            return ImageFont.truetype(font_path, size)
+        except Exception:
+            pass
+    return ImageFont.load_default()
+
 
 class BoundingBoxVisualizer:
     """Visualizes images with bounding boxes for verification purposes."""
@@ -20,40 +41,53 @@ class BoundingBoxVisualizer:
         """Draw bounding boxes on an image."""
         # Create a copy to avoid modifying the original
         img_with_boxes = image.copy()
-        draw = ImageDraw.Draw(img_with_boxes)
+        self._draw_bounding_boxes_inplace(img_with_boxes, annotations, categories, show_labels)
+        return img_with_boxes
+    
+    def _draw_bounding_boxes_inplace(self, image: Image.Image, annotations: List[CocoAnnotation],
+                                     categories: dict, show_labels: bool = True) -> None:
+        """Draw bounding boxes directly onto ``image``."""
+        bboxes = np.asarray([ann.bbox for ann in annotations], dtype=np.float64).reshape(-1, 4)
+        category_ids = np.fromiter((ann.category_id for ann in annotations), dtype=np.int64,
+                                   count=len(annotations))
+        annotation_ids = np.fromiter((ann.id for ann in annotations), dtype=np.int64,
+                                     count=len(annotations))
+        self._draw_bounding_boxes_from_array(image, bboxes, category_ids, annotation_ids,
+                                             categories, show_labels)
+    
+    def _draw_bounding_boxes_from_array(self, image: Image.Image, bboxes_xywh: np.ndarray,
+                                        category_ids: np.ndarray, annotation_ids: np.ndarray,
+                                        categories: dict, show_labels: bool = True) -> None:
+        """Draw ``(n, 4)`` xywh boxes directly onto ``image`` without building annotation objects."""
+        draw = ImageDraw.Draw(image)
         
         # Scale font and line width based on image size for better visibility
         image_size = max(image.width, image.height)
         font_size = max(16, int(image_size / 150))  # Dynamic font size
         line_width = max(3, int(image_size / 800))   # Dynamic line width
         
-        # Try to use a better font if available
-        try:
-            font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-        except:
-            try:
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
+        font = load_font(FONT_BOLD, font_size)
         
-        for i, ann in enumerate(annotations):
-            # Get bounding box coordinates [x, y, width, height]
-            x, y, width, height = ann.bbox
+        # Color and label name per category, looked up once rather than per box
+        category_ids = category_ids.tolist()
+        color_by_category = {cat_id: self.colors[cat_id % len(self.colors)] for cat_id in set(category_ids)}
+        name_by_category = {cat_id: categories.get(cat_id, f"Category {cat_id}") for cat_id in set(category_ids)}
+        
+        for (x, y, width, height), category_id, annotation_id in zip(bboxes_xywh.tolist(), category_ids,
+                                                                     annotation_ids.tolist()):
+            # Bounding box coordinates [x, y, width, height]
             x1, y1 = int(x), int(y)
             x2, y2 = int(x + width), int(y + height)
             
             # Choose color based on category
-            color = self.colors[ann.category_id % len(self.colors)]
+            color = color_by_category[category_id]
             
             # Draw bounding box with dynamic width
             draw.rectangle([x1, y1, x2, y2], outline=color, width=line_width)
             
             if show_labels:
-                # Get category name
-                category_name = categories.get(ann.category_id, f"Category {ann.category_id}")
-                
                 # Draw label background
-                label = f"{category_name} (ID: {ann.id})"
+                label = f"{name_by_category[category_id]} (ID: {annotation_id})"
                 bbox = draw.textbbox((0, 0), label, font=font)
                 label_width = bbox[2] - bbox[0]
                 label_height = bbox[3] - bbox[1]
@@ -68,47 +102,32 @@ class BoundingBoxVisualizer:
                 
                 # Draw label text
                 draw.text((label_x + 2, label_y + 2), label, fill='white', font=font)
-        
-        return img_with_boxes
     
     def draw_tile_boundaries(self, image: Image.Image, tile_size: Tuple[int, int], 
                             overlap: int = 0, highlight_tile: Optional[Tuple[int, int]] = None) -> Image.Image:
         """Draw tile boundaries on an image to show how it would be sliced."""
         img_with_tiles = image.copy()
-        draw = ImageDraw.Draw(img_with_tiles)
+        self._draw_tile_boundaries_inplace(img_with_tiles, tile_size, overlap, highlight_tile)
+        return img_with_tiles
+    
+    def _draw_tile_boundaries_inplace(self, image: Image.Image, tile_size: Tuple[int, int],
+                                      overlap: int = 0, highlight_tile: Optional[Tuple[int, int]] = None) -> None:
+        """Draw tile boundaries directly onto ``image``."""
+        draw = ImageDraw.Draw(image)
         
         img_width, img_height = image.size
         tile_width, tile_height = tile_size
-        step_x = tile_width - overlap
-        step_y = tile_height - overlap
-        
-        # Generate tile positions (same logic as TilingEngine)
-        tile_positions = []
-        
-        # Regular grid
-        for y in range(0, img_height - tile_height + 1, step_y):
-            for x in range(0, img_width - tile_width + 1, step_x):
-                tile_positions.append((x, y))
-        
-        # Edge tiles
-        if img_width % step_x != 0:
-            x = img_width - tile_width
-            for y in range(0, img_height - tile_height + 1, step_y):
-                tile_positions.append((x, y))
-        
-        if img_height % step_y != 0:
-            y = img_height - tile_height
-            for x in range(0, img_width - tile_width + 1, step_x):
-                tile_positions.append((x, y))
-        
-        # Corner tile
-        if img_width % step_x != 0 and img_height % step_y != 0:
-            x = img_width - tile_width
-            y = img_height - tile_height
-            tile_positions.append((x, y))
+        
+        # Tile positions come from TilingEngine itself (vectorized and memoized
+        # per image size), so the drawn grid is exactly the grid that is tiled
+        engine = TilingEngine(TilingConfig(tile_size=tuple(tile_size), overlap=overlap))
+        tile_positions = engine.tile_offsets(image.size).tolist()
+        highlight_tile = tuple(highlight_tile) if highlight_tile else None
         
         # Draw tile boundaries
         line_width = max(2, int(max(img_width, img_height) / 1000))  # Dynamic line width
+        font_size = max(12, int(max(img_width, img_height) / 200))
+        font = load_font(FONT_BOLD, font_size)
         
         for i, (x, y) in enumerate(tile_positions):
             # Choose color and width for highlighting
@@ -123,13 +142,6 @@ class BoundingBoxVisualizer:
             draw.rectangle([x, y, x + tile_width, y + tile_height], 
                           outline=color, width=width)
             
-            # Add tile index
-            font_size = max(12, int(max(img_width, img_height) / 200))
-            try:
-                font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", font_size)
-            except:
-                font = ImageFont.load_default()
-            
             # Draw tile number with background
             tile_label = f"T{i+1}"
             bbox = draw.textbbox((0, 0), tile_label, font=font)
@@ -141,8 +153,6 @@ class BoundingBoxVisualizer:
             draw.rectangle([label_x - 2, label_y - 2, label_x + label_width + 2, 
                           label_y + label_height + 2], fill='white', outline='black')
             draw.text((label_x, label_y), tile_label, fill='black', font=font)
-        
-        return img_with_tiles
 
     def create_comparison_view(self, original_img: Image.Image, tiled_img: Image.Image,
                               original_annotations: List[CocoAnnotation], 
@@ -150,10 +160,11 @@ class BoundingBoxVisualizer:
                               categories: dict, tile_offset: Tuple[int, int]) -> Image.Image:
         """Create a side-by-side comparison of original and tiled images with boxes."""
         
-        # Draw bounding boxes and tile boundaries on original image
+        # Draw bounding boxes and tile boundaries on one copy of the original image
         # First draw tile boundaries, then bounding boxes on top
-        orig_with_tiles = self.draw_tile_boundaries(original_img, (512, 512), 0, tile_offset)
-        orig_with_boxes = self.draw_bounding_boxes(orig_with_tiles, original_annotations, categories)
+        orig_with_boxes = original_img.copy()
+        self._draw_tile_boundaries_inplace(orig_with_boxes, (512, 512), 0, tile_offset)
+        self._draw_bounding_boxes_inplace(orig_with_boxes, original_annotations, categories)
         
         # Draw only bounding boxes on tiled image
         tiled_with_boxes = self.draw_bounding_boxes(tiled_img, tiled_annotations, categories)
@@ -165,11 +176,7 @@ class BoundingBoxVisualizer:
         comparison = Image.new('RGB', (total_width, total_height), 'white')
         draw = ImageDraw.Draw(comparison)
         
-        # Try to use a better font for titles
-        try:
-            title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20)
-        except:
-            title_font = ImageFont.load_default()
+        title_font = load_font(FONT_BOLD, 20)
         
         # Add titles
         draw.text((10, 10), "Original Image", fill='black', font=title_font)
@@ -202,38 +209,35 @@ class BoundingBoxVisualizer:
             scale_factor = max_width / img_width
             new_width = max_width
             new_height = int(img_height * scale_factor)
-            scaled_image = image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+            scaled_image = image.resize((new_width, new_height), Image.LANCZOS)
             
             # Scale tile size and annotations accordingly
             scaled_tile_size = (int(tile_size[0] * scale_factor), int(tile_size[1] * scale_factor))
             scaled_overlap = int(overlap * scale_factor)
             
-            # Scale annotations
-            scaled_annotations = []
-            for ann in annotations:
-                scaled_bbox = [coord * scale_factor for coord in ann.bbox]
-                scaled_ann = CocoAnnotation(
-                    id=ann.id,
-                    image_id=ann.image_id,
-                    category_id=ann.category_id,
-                    segmentation=ann.segmentation,
-                    area=ann.area * (scale_factor ** 2),
-                    bbox=scaled_bbox,
-                    iscrowd=ann.iscrowd
-                )
-                scaled_annotations.append(scaled_ann)
+            # Scale all boxes in one array operation
+            bboxes = np.asarray([ann.bbox for ann in annotations], dtype=np.float64).reshape(-1, 4)
+            scaled_bboxes = bboxes * scale_factor
         else:
             scaled_image = image
             scaled_tile_size = tile_size
             scaled_overlap = overlap
-            scaled_annotations = annotations
+            scaled_bboxes = np.asarray([ann.bbox for ann in annotations], dtype=np.float64).reshape(-1, 4)
             scale_factor = 1.0
         
+        # The resized image is already a new image; only the caller's image needs a copy
+        final_image = scaled_image.copy() if scaled_image is image else scaled_image
+        
         # Draw tile boundaries first
-        img_with_tiles = self.draw_tile_boundaries(scaled_image, scaled_tile_size, scaled_overlap)
+        self._draw_tile_boundaries_inplace(final_image, scaled_tile_size, scaled_overlap)
         
         # Draw annotations on top
-        final_image = self.draw_bounding_boxes(img_with_tiles, scaled_annotations, categories)
+        category_ids = np.fromiter((ann.category_id for ann in annotations), dtype=np.int64,
+                                   count=len(annotations))
+        annotation_ids = np.fromiter((ann.id for ann in annotations), dtype=np.int64,
+                                     count=len(annotations))
+        self._draw_bounding_boxes_from_array(final_image, scaled_bboxes, category_ids, annotation_ids,
+                                             categories)
         
         # Add title and info
         info_height = 80
@@ -244,12 +248,8 @@ class BoundingBoxVisualizer:
         draw = ImageDraw.Draw(overview)
         
         # Add title
-        try:
-            title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 24)
-            info_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 16)
-        except:
-            title_font = ImageFont.load_default()
-            info_font = ImageFont.load_default()
+        title_font = load_font(FONT_BOLD, 24)
+        info_font = load_font(FONT_REGULAR, 16)
         
         title = "Tiling Overview with Annotations"
         draw.text((10, 10), title, fill='black', font=title_font)
@@ -263,24 +263,38 @@ class BoundingBoxVisualizer:
         return overview
     
     def visualize_dataset(self, dataset_path: str, output_dir: str, 
-                         max_samples: int = 10, show_comparisons: bool = False) -> None:
-        """Visualize a dataset with bounding boxes."""
+                         max_samples: int = 10, show_comparisons: bool = False,
+                         num_workers: int = 1,
+                         dataset: Optional[CocoDataset] = None,
+                         min_mtime: Optional[float] = None) -> None:
+        """Visualize a dataset with bounding boxes.
+        
+        ``dataset`` may be passed in when the caller has already loaded the
+        annotations of ``dataset_path``; images are still read from that path.
+        With ``min_mtime`` set (typically the annotation file's mtime), the sample
+        is drawn with a fixed seed so re-runs pick the same images under the same
+        output names, and outputs newer than both it and their source image are
+        kept instead of re-rendered.
+        """
         
         # Load dataset
-        annotations_path = os.path.join(dataset_path, "train", "_annotations.coco.json")
-        if not os.path.exists(annotations_path):
-            raise FileNotFoundError(f"Annotations file not found: {annotations_path}")
-        
-        dataset = CocoDataset.from_json(annotations_path)
+        if dataset is None:
+            annotations_path = os.path.join(dataset_path, "train", "_annotations.coco.json")
+            if not os.path.exists(annotations_path):
+                raise FileNotFoundError(f"Annotations file not found: {annotations_path}")
+            
+            dataset = CocoDataset.from_json(annotations_path)
         
         # Create category lookup
-        categories = {cat.id: cat.name for cat in dataset.categories}
+        categories = dataset.category_names()
+        annotations_by_image = dataset.annotations_by_image()
         
         # Create output directory
         os.makedirs(output_dir, exist_ok=True)
         
-        # Sample images to visualize
-        sample_images = random.sample(dataset.images, min(max_samples, len(dataset.images)))
+        # Sample images to visualize; incremental runs need the same sample every time
+        sampler = random.Random(0) if min_mtime is not None else random
+        sample_images = sampler.sample(dataset.images, min(max_samples, len(dataset.images)))
         
         print(f"Visualizing {len(sample_images)} images from dataset...")
         print(f"Total categories: {len(categories)}")
@@ -288,55 +302,94 @@ class BoundingBoxVisualizer:
             print(f"  - {cat_name} (ID: {cat_id})")
         print()
         
-        for i, image_info in enumerate(sample_images):
-            print(f"Processing image {i+1}/{len(sample_images)}: {image_info.file_name}")
-            
-            # Load image
-            image_path = os.path.join(dataset_path, "train", image_info.file_name)
-            if not os.path.exists(image_path):
-                print(f"  Warning: Image file not found: {image_path}")
-                continue
-            
+        # Images are rendered independently; results come back in sample order so
+        # the log reads the same as a sequential run
+        total = len(sample_images)
+        output_names = [f"visualization_{i+1:03d}_{image_info.file_name}"
+                        for i, image_info in enumerate(sample_images)]
+        
+        # Modification times of existing outputs, listed once for incremental runs
+        output_mtimes = {}
+        if min_mtime is not None:
+            with os.scandir(output_dir) as entries:
+                output_mtimes = {entry.name: entry.stat().st_mtime for entry in entries if entry.is_file()}
+        
+        tasks = [(i, total, image_info, annotations_by_image.get(image_info.id, []),
+                  output_name, output_mtimes.get(output_name))
+                 for i, (image_info, output_name) in enumerate(zip(sample_images, output_names))]
+        render = partial(self.render_sample, dataset_path=dataset_path, output_dir=output_dir,
+                         categories=categories, min_mtime=min_mtime)
+        
+        if num_workers > 1 and total > 1:
+            with ProcessPoolExecutor(max_workers=min(num_workers, total)) as executor:
+                for log_lines in executor.map(render, tasks):
+                    print("\n".join(log_lines))
+        else:
+            for log_lines in map(render, tasks):
+                print("\n".join(log_lines))
+        
+        print(f"\nVisualization complete! Check the '{output_dir}' folder.")
+    
+    def render_sample(self, task, dataset_path: str, output_dir: str, categories: dict,
+                      min_mtime: Optional[float] = None) -> List[str]:
+        """Draw and save the bounding boxes of one sampled image and return its log lines."""
+        i, total, image_info, image_annotations, output_filename, output_mtime = task
+        log = [f"Processing image {i+1}/{total}: {image_info.file_name}"]
+        output_path = os.path.join(output_dir, output_filename)
+        
+        image_path = os.path.join(dataset_path, "train", image_info.file_name)
+        
+        # Keep an existing output that is newer than the annotations and the source image
+        if min_mtime is not None and output_mtime is not None:
             try:
-                image = Image.open(image_path)
-                
-                # Get annotations for this image
-                image_annotations = [ann for ann in dataset.annotations 
-                                   if ann.image_id == image_info.id]
-                
-                print(f"  Found {len(image_annotations)} annotations")
-                
-                # Draw bounding boxes
-                img_with_boxes = self.draw_bounding_boxes(image, image_annotations, categories)
+                if output_mtime >= max(min_mtime, os.stat(image_path).st_mtime):
+                    log.append(f"  Up to date: {output_path}")
+                    return log
+            except FileNotFoundError:
+                pass
+        
+        # Load image; a missing file surfaces from Image.open instead of a separate exists() check
+        try:
+            image = Image.open(image_path)
+        except FileNotFoundError:
+            log.append(f"  Warning: Image file not found: {image_path}")
+            return log
+        
+        try:
+            log.append(f"  Found {len(image_annotations)} annotations")
+            
+            # Draw bounding boxes straight onto the loaded image; nothing else uses it
+            with image:
+                self._draw_bounding_boxes_inplace(image, image_annotations, categories)
                 
                 # Save visualization
-                output_filename = f"visualization_{i+1:03d}_{image_info.file_name}"
-                output_path = os.path.join(output_dir, output_filename)
-                img_with_boxes.save(output_path)
-                
-                print(f"  Saved: {output_path}")
-                
-            except Exception as e:
-                print(f"  Error processing {image_info.file_name}: {e}")
+                image.save(output_path)
+            
+            log.append(f"  Saved: {output_path}")
+            
+        except Exception as e:
+            log.append(f"  Error processing {image_info.file_name}: {e}")
         
-        print(f"\nVisualization complete! Check the '{output_dir}' folder.")
+        return log
     
-    def create_summary_report(self, dataset_path: str, output_dir: str) -> None:
-        """Create a summary report of the dataset."""
+    def create_summary_report(self, dataset_path: str, output_dir: str,
+                              dataset: Optional[CocoDataset] = None) -> None:
+        """Create a summary report of the dataset, reusing ``dataset`` when it is already loaded."""
         
-        annotations_path = os.path.join(dataset_path, "train", "_annotations.coco.json")
-        dataset = CocoDataset.from_json(annotations_path)
+        if dataset is None:
+            annotations_path = os.path.join(dataset_path, "train", "_annotations.coco.json")
+            dataset = CocoDataset.from_json(annotations_path)
         
         # Calculate statistics
         total_images = len(dataset.images)
         total_annotations = len(dataset.annotations)
-        categories = {cat.id: cat.name for cat in dataset.categories}
+        categories = dataset.category_names()
         
-        # Count annotations per category
-        category_counts = {}
-        for ann in dataset.annotations:
-            cat_name = categories.get(ann.category_id, f"Unknown_{ann.category_id}")
-            category_counts[cat_name] = category_counts.get(cat_name, 0) + 1
+        # Count annotations per category ID in one C-level pass, then fold the
+        # IDs into names (IDs sharing a name are reported together)
+        category_counts = Counter()
+        for cat_id, count in Counter(map(attrgetter('category_id'), dataset.annotations)).items():
+            category_counts[categories.get(cat_id, f"Unknown_{cat_id}")] += count
         
         # Calculate average annotations per image
         avg_annotations = total_annotations / total_images if total_images > 0 else 0
@@ -365,6 +418,7 @@ class BoundingBoxVisualizer:
                 f.write("-" * 20 + "\n")
                 f.write(f"Width range: {min(widths)} - {max(widths)} pixels\n")
                 f.write(f"Height range: {min(heights)} - {max(heights)} pixels\n")
-                f.write(f"Most common size: {max(set(zip(widths, heights)), key=zip(widths, heights).count)}\n")
+                most_common_size = Counter(zip(widths, heights)).most_common(1)[0][0]
+                f.write(f"Most common size: {most_common_size}\n")
         
         print(f"Summary report saved: {report_path}")
\ No newline at end of file
@@ -6,6 +6,7 @@ Quick verification script to check if tiling preserved annotations correctly
 import sys
 import os
 import json
+from collections import Counter, defaultdict
 from pathlib import Path
 
 # Add src to Python path
@@ -70,10 +71,11 @@ def verify_tiling_process(original_path: str, tiled_path: str):
     categories_match = original_categories == tiled_categories
     print(f"Categories preserved: {'✅ Yes' if categories_match else '❌ No'}")
     
+    # Count annotations per category in one pass over each dataset
+    original_counts = Counter(ann.category_id for ann in original_dataset.annotations)
+    tiled_counts = Counter(ann.category_id for ann in tiled_dataset.annotations)
     for cat_id, cat_name in original_categories.items():
-        original_count = sum(1 for ann in original_dataset.annotations if ann.category_id == cat_id)
-        tiled_count = sum(1 for ann in tiled_dataset.annotations if ann.category_id == cat_id)
-        print(f"  {cat_name} (ID {cat_id}): {original_count} → {tiled_count}")
+        print(f"  {cat_name} (ID {cat_id}): {original_counts[cat_id]} → {tiled_counts[cat_id]}")
     
     # Sample verification - check a few images
     print(f"\nSample Verification:")
@@ -81,19 +83,23 @@ def verify_tiling_process(original_path: str, tiled_path: str):
     
     sample_size = min(5, len(original_dataset.images))
     issues_found = 0
+    original_anns_by_image = original_dataset.annotations_by_image()
+    tiled_anns_by_image = tiled_dataset.annotations_by_image()
+    
+    # Tiles are named <stem>_tile_<x>_<y>; group them by source stem once
+    tiles_by_base = defaultdict(list)
+    for tile_img in tiled_dataset.images:
+        tiles_by_base[tile_img.file_name.rpartition('_tile_')[0]].append(tile_img)
     
     for i in range(sample_size):
         original_img = original_dataset.images[i]
-        original_img_anns = [ann for ann in original_dataset.annotations if ann.image_id == original_img.id]
+        original_img_anns = original_anns_by_image.get(original_img.id, [])
         
-        # Find corresponding tiles
-        base_name = original_img.file_name.split('.')[0]
-        corresponding_tiles = [img for img in tiled_dataset.images if base_name in img.file_name]
+        # Find corresponding tiles; the writer names them after Path(file_name).stem
+        base_name = Path(original_img.file_name).stem
+        corresponding_tiles = tiles_by_base.get(base_name, [])
         
-        total_tile_anns = 0
-        for tile_img in corresponding_tiles:
-            tile_anns = [ann for ann in tiled_dataset.annotations if ann.image_id == tile_img.id]
-            total_tile_anns += len(tile_anns)
+        total_tile_anns = sum(len(tiled_anns_by_image.get(tile_img.id, [])) for tile_img in corresponding_tiles)
         
         print(f"  {original_img.file_name}: {len(original_img_anns)} annotations")
         print(f"    → {len(corresponding_tiles)} tiles with {total_tile_anns} total annotations")
@@ -14,6 +14,8 @@ from pathlib import Path
 # Add src to Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
+from src.config.settings import env_num_workers
+from src.models.coco import CocoDataset
 from src.utils.visualization import BoundingBoxVisualizer
 
 
@@ -31,6 +33,10 @@ def main():
                        help="Compare original vs tiled datasets")
     parser.add_argument("--summary", action="store_true", 
                        help="Create dataset summary report")
+    parser.add_argument("--num-workers", type=int, default=env_num_workers(),
+                       help="Number of processes used for rendering (default: NUM_WORKERS, currently %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+                       help="Use a fixed sample and skip visualizations already newer than their inputs")
     
     args = parser.parse_args()
     
@@ -41,55 +47,70 @@ def main():
     print(f"Samples to visualize: {args.samples}")
     print()
     
-    # Check if input directory exists
-    if not os.path.exists(args.input):
-        print(f"Error: Input directory does not exist: {args.input}")
-        sys.exit(1)
-    
-    # Check if annotations file exists
+    # Missing inputs are reported when their annotations fail to open, rather
+    # than stat-ing every path up front
     annotations_file = os.path.join(args.input, "train", "_annotations.coco.json")
-    if not os.path.exists(annotations_file):
-        print(f"Error: Annotations file not found: {annotations_file}")
-        sys.exit(1)
+    tiled_annotations = os.path.join(args.tiled_input, "train", "_annotations.coco.json")
+    compare_tiled = args.compare and os.path.exists(args.tiled_input)
     
     try:
         visualizer = BoundingBoxVisualizer()
         
+        # Parse the annotations once for both the visualizations and the summary
+        try:
+            dataset = CocoDataset.from_json(annotations_file)
+        except FileNotFoundError:
+            if not os.path.exists(args.input):
+                print(f"Error: Input directory does not exist: {args.input}")
+            else:
+                print(f"Error: Annotations file not found: {annotations_file}")
+            sys.exit(1)
+        
         # Create main visualizations
         print("Creating visualizations...")
         visualizer.visualize_dataset(
             dataset_path=args.input,
             output_dir=args.output,
-            max_samples=args.samples
+            max_samples=args.samples,
+            num_workers=args.num_workers,
+            dataset=dataset,
+            min_mtime=os.stat(annotations_file).st_mtime if args.incremental else None
         )
         
         # Create summary report if requested
         if args.summary:
             print("\nCreating summary report...")
-            visualizer.create_summary_report(args.input, args.output)
+            visualizer.create_summary_report(args.input, args.output, dataset=dataset)
         
         # Compare datasets if requested and tiled dataset exists
-        if args.compare and os.path.exists(args.tiled_input):
-            tiled_annotations = os.path.join(args.tiled_input, "train", "_annotations.coco.json")
-            if os.path.exists(tiled_annotations):
+        if compare_tiled:
+            try:
+                tiled_dataset = CocoDataset.from_json(tiled_annotations)
+            except FileNotFoundError:
+                tiled_dataset = None
+            
+            if tiled_dataset is not None:
                 print(f"\nCreating tiled dataset visualizations...")
                 tiled_output = os.path.join(args.output, "tiled_dataset")
                 visualizer.visualize_dataset(
                     dataset_path=args.tiled_input,
                     output_dir=tiled_output,
-                    max_samples=args.samples
+                    max_samples=args.samples,
+                    num_workers=args.num_workers,
+                    dataset=tiled_dataset,
+                    min_mtime=os.stat(tiled_annotations).st_mtime if args.incremental else None
                 )
                 
                 # Create comparison summary
                 print("Creating comparison summary...")
-                visualizer.create_summary_report(args.tiled_input, tiled_output)
+                visualizer.create_summary_report(args.tiled_input, tiled_output, dataset=tiled_dataset)
             else:
                 print(f"Warning: Tiled dataset annotations not found: {tiled_annotations}")
         
         print(f"\nVisualization complete!")
         print(f"Check the '{args.output}' directory for results.")
         
-        if args.compare and os.path.exists(args.tiled_input):
+        if compare_tiled:
             print(f"Tiled dataset visualizations are in: {os.path.join(args.output, 'tiled_dataset')}")
         
     except Exception as e: